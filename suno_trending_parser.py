@@ -1,24 +1,74 @@
 # suno_trending_parser.py
 # Парсер трендов Suno с ручным вводом SMS, скачиванием аудио и сохранением в SQLite
 
+import asyncio
 import time
 import re
 import os
+import shutil
 import sqlite3
+import aiohttp
 import requests
+from http.cookies import SimpleCookie
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urljoin
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
 
 # ==================== НАСТРОЙКИ ====================
 DB_FILE = 'suno_trends.db'        # Файл базы данных SQLite
 TABLE_NAME = 'tracks'
 DOWNLOAD_DIR = 'downloads'         # Папка для сохранения музыки
+DOWNLOAD_WORKERS = 8               # Количество параллельных скачиваний
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # Размер блока при записи файла
+DOWNLOAD_INMEMORY_LIMIT = 50 * 1024 * 1024  # Файлы до этого размера пишутся одним вызовом
+PAGE_FETCH_CONCURRENCY = 10        # Одновременных HTTP-запросов к страницам треков
+CHROMEDRIVER_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'suno_parser', 'chromedriver_path')
+CHROMEDRIVER_CACHE_TTL = 7 * 24 * 3600  # Раз в неделю перепроверяем версию драйвера
+DEBUG = bool(os.environ.get('SUNO_DEBUG'))  # Сохранять HTML страницы трендов для отладки
+
+# WAL + synchronous=NORMAL: меньше fsync на каждый commit
+SQLITE_PRAGMAS = (
+    'journal_mode=WAL',
+    'synchronous=NORMAL',
+    'temp_store=MEMORY',
+    'cache_size=-20000',
+)
+
+# Регулярные выражения, компилируются один раз при загрузке модуля
+_PLAYS_RE = re.compile(r'([\d.]+)([KM]?)')
+_AUDIO_URL_RE = re.compile(r'(https?://[^\s\'"<>]+\.(mp3|wav|ogg|m4a|flac))', re.I)
+_AUDIO_SRC_RE = re.compile(r'\.(mp3|wav|ogg|m4a|flac)$', re.I)
+_STYLE_HREF = re.compile(r'/style/')
+
+# Таблица для удаления недопустимых в имени файла символов
+_BAD_FNAME_TBL = str.maketrans('', '', '\\/*?:"<>|')
+
+# XPath-выражения для страницы трендов
+_SONG_ROW_XPATH = etree.XPath('//div[@data-testid="song-row"]')
+_TRACK_FIELDS_XPATH = etree.XPath(
+    './/a[starts-with(@href, "/song/")]'
+    ' | .//a[starts-with(@href, "/@")]'
+    ' | .//button[@aria-label="Play Count"]'
+)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Общая HTTP-сессия: keep-alive переиспользует TCP/TLS-соединения между запросами
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': USER_AGENT})
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=Retry(total=3, backoff_factor=0.3))
+SESSION.mount('https://', _adapter)
+SESSION.mount('http://', _adapter)
 
 # Создаём папку для скачивания, если её нет
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
@@ -29,7 +79,7 @@ def create_database_and_table():
     """Создаёт файл базы данных и таблицу, если они не существуют,
        а также добавляет недостающие колонки."""
     try:
-        conn = sqlite3.connect(DB_FILE)
+        conn = get_db_connection()
         cursor = conn.cursor()
 
         cursor.execute(f"""
@@ -50,11 +100,11 @@ def create_database_and_table():
         conn.commit()
 
         cursor.execute(f"PRAGMA table_info({TABLE_NAME})")
-        existing_columns = [col[1] for col in cursor.fetchall()]
+        existing_columns = {col[1] for col in cursor.fetchall()}
         required_columns = [
             ('artist', 'TEXT'),
             ('title', 'TEXT'),
-            ('track_url', 'TEXT UNIQUE'),
+            ('track_url', 'TEXT'),
             ('audio_url', 'TEXT'),
             ('plays', 'INTEGER DEFAULT 0'),
             ('explicit', 'INTEGER DEFAULT 0'),
@@ -63,16 +113,31 @@ def create_database_and_table():
             ('styles_full', 'TEXT'),
             ('created_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP')
         ]
+        missing_columns = [(name, definition) for name, definition in required_columns
+                           if name not in existing_columns]
 
-        for col_name, col_def in required_columns:
-            if col_name not in existing_columns:
+        # На актуальной схеме ALTER не нужны; иначе все изменения — одной транзакцией
+        if missing_columns:
+            conn.execute("BEGIN")
+            for col_name, col_def in missing_columns:
                 try:
                     cursor.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {col_name} {col_def}")
                     print(f"➕ Добавлена колонка {col_name}")
                 except Exception as e:
                     print(f"⚠️ Не удалось добавить колонку {col_name}: {e}")
+            conn.commit()
+
+        # UNIQUE-колонку нельзя добавить через ALTER TABLE, поэтому в старых базах
+        # уникальность track_url (на ней держится INSERT OR IGNORE) обеспечивает индекс.
+        # В новых базах его роль играет автоиндекс UNIQUE — второй индекс не создаём
+        if not has_unique_url_index(cursor):
+            try:
+                cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{TABLE_NAME}_url ON {TABLE_NAME}(track_url)")
+            except sqlite3.IntegrityError as e:
+                # В таблице уже есть дубликаты track_url — работаем дальше без индекса
+                print(f"⚠️ Не удалось создать уникальный индекс по track_url ({e}), "
+                      f"в таблице есть дубликаты — новые треки могут задублироваться")
 
-        conn.commit()
         conn.close()
         print("✅ База данных SQLite и таблица проверены/созданы.")
     except Exception as e:
@@ -80,23 +145,37 @@ def create_database_and_table():
         exit(1)
 
 def get_db_connection():
-    return sqlite3.connect(DB_FILE)
-
-def track_exists(cursor, track_url):
-    cursor.execute(f"SELECT id FROM {TABLE_NAME} WHERE track_url = ?", (track_url,))
-    return cursor.fetchone() is not None
+    # isolation_level=None — транзакции открываем явно через BEGIN;
+    # timeout=30 задаёт busy_timeout (ожидание блокировки) — отдельный PRAGMA не нужен
+    conn = sqlite3.connect(DB_FILE, isolation_level=None, timeout=30)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
+def has_unique_url_index(cursor):
+    """Проверяет, есть ли уникальный индекс ровно по колонке track_url."""
+    indexes = cursor.execute(f"PRAGMA index_list({TABLE_NAME})").fetchall()
+    for index in indexes:
+        name, unique = index[1], index[2]
+        if unique:
+            columns = [col[2] for col in cursor.execute(f"PRAGMA index_info('{name}')").fetchall()]
+            if columns == ['track_url']:
+                return True
+    return False
 
 # ==================== ФУНКЦИИ ДЛЯ РАБОТЫ С ФАЙЛАМИ ====================
 
 def sanitize_filename(filename):
-    return re.sub(r'[\\/*?:"<>|]', "", filename).strip()
+    return filename.translate(_BAD_FNAME_TBL).strip()
+
+def audio_filepath(artist, title):
+    return os.path.join(DOWNLOAD_DIR, sanitize_filename(f"{artist} - {title}.mp3"))
 
 def download_audio(url, artist, title):
     if not url:
         return None
 
-    filename = sanitize_filename(f"{artist} - {title}.mp3")
-    filepath = os.path.join(DOWNLOAD_DIR, filename)
+    filepath = audio_filepath(artist, title)
 
     if os.path.exists(filepath):
         print(f"  ⏩ Файл уже существует: {filepath}")
@@ -104,8 +183,7 @@ def download_audio(url, artist, title):
 
     try:
         print(f"  ⬇️ Скачивание: {url}")
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-        r = requests.get(url, stream=True, timeout=45, headers=headers)
+        r = SESSION.get(url, stream=True, timeout=45)
         r.raise_for_status()
 
         content_type = r.headers.get('Content-Type', '')
@@ -113,9 +191,15 @@ def download_audio(url, artist, title):
             print(f"  ⚠️ URL ведёт не на аудиофайл ({content_type}), пропускаем.")
             return None
 
+        content_length = int(r.headers.get('Content-Length') or 0)
         with open(filepath, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
+            if 0 < content_length <= DOWNLOAD_INMEMORY_LIMIT:
+                # Небольшой файл известного размера — читаем целиком и пишем одним вызовом
+                f.write(r.content)
+            else:
+                # Копирование блоками по 1 МБ на стороне C, без цикла по чанкам в Python
+                r.raw.decode_content = True
+                shutil.copyfileobj(r.raw, f, length=DOWNLOAD_CHUNK_SIZE)
         print(f"  ✅ Сохранено: {filepath}")
         return filepath
     except Exception as e:
@@ -124,6 +208,165 @@ def download_audio(url, artist, title):
 
 # ==================== ОСНОВНАЯ ФУНКЦИЯ ПАРСИНГА ====================
 
+def element_text(element):
+    """Текст элемента lxml — аналог get_text(strip=True) из BeautifulSoup."""
+    return ''.join(part.strip() for part in element.itertext())
+
+def extract_block_fields(block):
+    """Одним XPath-запросом находит в блоке трека ссылку на трек, ссылку на автора
+       и кнопку с числом прослушиваний (по первому совпадению каждого)."""
+    title_tag = author_tag = plays_tag = None
+    for element in _TRACK_FIELDS_XPATH(block):
+        if element.tag == 'button':
+            if plays_tag is None:
+                plays_tag = element
+        elif element.get('href', '').startswith('/song/'):
+            if title_tag is None:
+                title_tag = element
+        elif author_tag is None:
+            author_tag = element
+    return title_tag, author_tag, plays_tag
+
+def get_chromedriver_path():
+    """Возвращает путь к chromedriver, кэшируя результат ChromeDriverManager().install()."""
+    try:
+        if time.time() - os.path.getmtime(CHROMEDRIVER_CACHE) < CHROMEDRIVER_CACHE_TTL:
+            with open(CHROMEDRIVER_CACHE, encoding='utf-8') as f:
+                path = f.read().strip()
+            if path and os.path.exists(path):
+                return path
+    except OSError:
+        pass
+
+    path = ChromeDriverManager().install()
+    try:
+        os.makedirs(os.path.dirname(CHROMEDRIVER_CACHE), exist_ok=True)
+        with open(CHROMEDRIVER_CACHE, 'w', encoding='utf-8') as f:
+            f.write(path)
+    except OSError as e:
+        print(f"⚠️ Не удалось сохранить путь к chromedriver: {e}")
+    return path
+
+def find_raw_audio_url(html):
+    """Первая ссылка на аудио в сыром HTML, кроме заглушки sil-100.mp3 (без построения дерева)."""
+    for match in _AUDIO_URL_RE.finditer(html):
+        url = match.group(1)
+        if 'sil-100.mp3' not in url:
+            return url
+    return None
+
+def find_audio_url(html):
+    """Ищет ссылку на аудио в HTML страницы трека (заглушка sil-100.mp3 игнорируется)."""
+    # Сначала один проход регуляркой по сырому HTML
+    url = find_raw_audio_url(html)
+    if url:
+        return url
+
+    # Запасной вариант: тег <audio> с src на аудиофайл
+    audio_soup = BeautifulSoup(html, 'lxml')
+    audio_tag = audio_soup.find('audio', src=_AUDIO_SRC_RE)
+    if audio_tag and audio_tag.has_attr('src'):
+        potential = audio_tag['src']
+        if 'sil-100.mp3' not in potential:
+            return potential
+    return None
+
+async def fetch_track_page(session, semaphore, track):
+    """Загружает страницу трека по HTTP; при ошибке возвращает None.
+       Разбор HTML делается вне event loop, чтобы не тормозить остальные запросы."""
+    async with semaphore:
+        try:
+            async with session.get(track['track_url']) as r:
+                r.raise_for_status()
+                return await r.text()
+        except Exception as e:
+            print(f"  ⚠️ HTTP-запрос не удался ({track['track_url']}): {e}")
+            return None
+
+def load_browser_cookies(cookie_jar, browser_cookies):
+    """Переносит cookies из Selenium в cookie jar aiohttp с сохранением domain и path,
+       чтобы cookies авторизации не отправлялись на сторонние хосты."""
+    # aiohttp хранит ".suno.com" и "suno.com" под одним ключом, поэтому cookies
+    # конкретного хоста загружаем последними — при совпадении имён побеждают они
+    ordered = sorted(browser_cookies, key=lambda c: not (c.get('domain') or '').startswith('.'))
+    for cookie in ordered:
+        # По одному cookie за раз, чтобы сохранить domain и path каждого
+        jar_cookie = SimpleCookie()
+        jar_cookie[cookie['name']] = cookie['value']
+        morsel = jar_cookie[cookie['name']]
+        morsel['domain'] = cookie.get('domain') or 'suno.com'
+        morsel['path'] = cookie.get('path', '/')
+        if cookie.get('secure'):
+            morsel['secure'] = True
+        cookie_jar.update_cookies(jar_cookie)
+
+async def fetch_track_pages(tracks, browser_cookies=()):
+    """Параллельно загружает страницы треков (не более PAGE_FETCH_CONCURRENCY одновременно).
+       Возвращает список HTML (или None) в порядке tracks."""
+    semaphore = asyncio.Semaphore(PAGE_FETCH_CONCURRENCY)
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=16),
+        timeout=aiohttp.ClientTimeout(total=20),
+        headers={'User-Agent': USER_AGENT},
+    ) as session:
+        load_browser_cookies(session.cookie_jar, browser_cookies)
+        return await asyncio.gather(*(fetch_track_page(session, semaphore, track) for track in tracks))
+
+def find_styles(html):
+    """Собирает стили из ссылок /style/ в HTML страницы трека."""
+    soup = BeautifulSoup(html, 'lxml', parse_only=SoupStrainer('a', href=_STYLE_HREF))
+    styles = ', '.join(a.get_text(strip=True) for a in soup.find_all('a') if a.get_text(strip=True))
+    return styles if styles else None
+
+def print_styles(track):
+    if track['styles_preview']:
+        print(f"    🏷️ Стили (preview): {track['styles_preview'][:100]}{'...' if len(track['styles_preview']) > 100 else ''}")
+    if track['styles_full'] and track['styles_full'] != track['styles_preview']:
+        print(f"    🏷️ Стили (full):   {track['styles_full'][:100]}{'...' if len(track['styles_full']) > 100 else ''}")
+
+def scrape_track_page(driver, track):
+    """Открывает страницу трека в браузере, собирает стили и возвращает ссылку на аудио."""
+    driver.get(track['track_url'])
+    # Одно ожидание: ссылки на стили и настоящая ссылка на аудио (не заглушка).
+    # page_source тянем только после появления стилей — это дорогой вызов
+    try:
+        WebDriverWait(driver, 10, poll_frequency=0.25).until(
+            lambda d: d.find_elements(By.XPATH, "//a[contains(@href, '/style/')]")
+            and find_raw_audio_url(d.page_source)
+        )
+    except TimeoutException:
+        pass
+
+    # ─── Поиск стилей (защищённый блок) ───
+    try:
+        style_container = driver.find_element(By.XPATH, "//*[.//a[contains(@href, '/style/')]]")
+
+        style_links = style_container.find_elements(By.XPATH, ".//a[contains(@href, '/style/')]")
+        preview = ', '.join(link.text.strip() for link in style_links if link.text.strip())
+        track['styles_preview'] = preview if preview else None
+
+        try:
+            show_button = style_container.find_element(
+                By.XPATH,
+                ".//button[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show full') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'full styles')]"
+            )
+            driver.execute_script("arguments[0].click();", show_button)
+            time.sleep(2)
+
+            all_style_links = style_container.find_elements(By.XPATH, ".//a[contains(@href, '/style/')]")
+            full = ', '.join(link.text.strip() for link in all_style_links if link.text.strip())
+            track['styles_full'] = full if full else preview
+        except:
+            track['styles_full'] = preview
+
+        print_styles(track)
+
+    except Exception:
+        # Тихо пропускаем — стили просто останутся None
+        pass
+
+    return find_audio_url(driver.page_source)
+
 def parse_trending(max_tracks=50):
     options = webdriver.ChromeOptions()
     # options.add_argument('--headless=new')  # раскомментировать для фонового режима
@@ -135,7 +378,7 @@ def parse_trending(max_tracks=50):
     options.add_argument('--window-size=1920,1080')
     options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36')
 
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    driver = webdriver.Chrome(service=Service(get_chromedriver_path()), options=options)
     tracks_data = []
 
     try:
@@ -161,39 +404,42 @@ def parse_trending(max_tracks=50):
         last_height = driver.execute_script("return document.body.scrollHeight")
         for i in range(15):
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(3)
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
+            # Ждём роста страницы вместо фиксированной паузы
+            try:
+                WebDriverWait(driver, 5, poll_frequency=0.2).until(
+                    lambda d: d.execute_script("return document.body.scrollHeight") > last_height
+                )
+            except TimeoutException:
                 print("  Достигнут конец страницы.")
                 break
-            last_height = new_height
+            last_height = driver.execute_script("return document.body.scrollHeight")
             print(f"  Скролл {i+1}...")
 
-        debug_file = f"debug_trending_{int(time.time())}.html"
-        with open(debug_file, "w", encoding="utf-8") as f:
-            f.write(driver.page_source)
-        print(f"📁 Отладочный HTML: {debug_file}")
+        page_source = driver.page_source
+
+        if DEBUG:
+            debug_file = f"debug_trending_{int(time.time())}.html"
+            with open(debug_file, "wb") as f:
+                f.write(page_source.encode('utf-8'))
+            print(f"📁 Отладочный HTML: {debug_file}")
 
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-        song_blocks = soup.find_all('div', attrs={'data-testid': 'song-row'})
+        # lxml-дерево без объектов BeautifulSoup: заметно меньше памяти на большой странице
+        tree = etree.HTML(page_source)
+        song_blocks = _SONG_ROW_XPATH(tree) if tree is not None else []
         print(f"Найдено блоков треков: {len(song_blocks)}")
 
         for index, block in enumerate(song_blocks[:max_tracks]):
             print(f"\n--- Трек {index+1} ---")
 
-            title_tag = block.find('a', href=re.compile(r'^/song/'))
-            title = title_tag.get_text(strip=True) if title_tag else 'Untitled'
-
-            author_tag = block.find('a', href=re.compile(r'^/@'))
-            artist = author_tag.get_text(strip=True) if author_tag else 'Unknown'
-
-            track_url = urljoin('https://suno.com', title_tag['href']) if title_tag and title_tag.has_attr('href') else None
+            title_tag, author_tag, plays_tag = extract_block_fields(block)
+            title = element_text(title_tag) if title_tag is not None else 'Untitled'
+            artist = element_text(author_tag) if author_tag is not None else 'Unknown'
+            track_url = urljoin('https://suno.com', title_tag.get('href')) if title_tag is not None else None
 
             plays = 0
-            plays_tag = block.find('button', attrs={'aria-label': 'Play Count'})
-            if plays_tag:
-                plays_text = plays_tag.get_text(strip=True)
-                match = re.match(r'([\d.]+)([KM]?)', plays_text.upper())
+            if plays_tag is not None:
+                plays_text = element_text(plays_tag)
+                match = _PLAYS_RE.match(plays_text.upper())
                 if match:
                     val, suffix = match.groups()
                     mult = 1000 if suffix == 'K' else 1000000 if suffix == 'M' else 1
@@ -220,86 +466,71 @@ def parse_trending(max_tracks=50):
         print("\n=== ЭТАП 3: Получение аудио и стилей ===")
         conn = get_db_connection()
         cursor = conn.cursor()
+        # Один SELECT вместо запроса на каждый трек
+        known_urls = {row[0] for row in cursor.execute(f"SELECT track_url FROM {TABLE_NAME}")}
+        cursor.close()
+        conn.close()
+        pending = []
+        to_download = []
 
         for track in tracks_data:
             if not track['track_url']:
                 print("  ⚠️ Пропуск: нет ссылки")
                 continue
 
-            if track_exists(cursor, track['track_url']):
+            if track['track_url'] in known_urls:
                 print(f"  ⏩ Уже в базе: {track['title']}")
                 continue
+            known_urls.add(track['track_url'])
+            pending.append(track)
 
-            print(f"\n  Обрабатываем: {track['artist']} - {track['title']}")
-            driver.get(track['track_url'])
-            time.sleep(4)  # даём странице загрузиться
+        # Сначала параллельные HTTP-запросы — без рендеринга страниц в браузере
+        pages = []
+        if pending:
+            print(f"Загружаем страницы треков по HTTP ({len(pending)})...")
+            # Используем cookies авторизованной сессии браузера
+            pages = asyncio.run(fetch_track_pages(pending, driver.get_cookies()))
 
-            # ─── Поиск стилей (защищённый блок) ───
-            try:
-                style_container = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located(
-                        (By.XPATH, "//*[.//a[contains(@href, '/style/')]]")
-                    )
-                )
+        for track, html in zip(pending, pages):
+            print(f"\n  Обрабатываем: {track['artist']} - {track['title']}")
+            if html:
+                try:
+                    track['audio_url'] = find_audio_url(html)
+                    if track['audio_url']:
+                        preview = find_styles(html)
+                        track['styles_preview'] = preview
+                        track['styles_full'] = preview
+                        print_styles(track)
+                except Exception as e:
+                    print(f"    ⚠️ Ошибка разбора HTML ({e}), используем браузер")
 
-                style_links = style_container.find_elements(By.XPATH, ".//a[contains(@href, '/style/')]")
-                preview = ', '.join(link.text.strip() for link in style_links if link.text.strip())
-                track['styles_preview'] = preview if preview else None
+            if not track['audio_url']:
+                track['audio_url'] = scrape_track_page(driver, track)
 
-                try:
-                    show_button = style_container.find_element(
-                        By.XPATH,
-                        ".//button[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'show full') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'full styles')]"
-                    )
-                    driver.execute_script("arguments[0].click();", show_button)
-                    time.sleep(2)
-
-                    all_style_links = style_container.find_elements(By.XPATH, ".//a[contains(@href, '/style/')]")
-                    full = ', '.join(link.text.strip() for link in all_style_links if link.text.strip())
-                    track['styles_full'] = full if full else preview
-                except:
-                    track['styles_full'] = preview
-
-                if track['styles_preview']:
-                    print(f"    🏷️ Стили (preview): {track['styles_preview'][:100]}{'...' if len(track['styles_preview']) > 100 else ''}")
-                if track['styles_full'] and track['styles_full'] != track['styles_preview']:
-                    print(f"    🏷️ Стили (full):   {track['styles_full'][:100]}{'...' if len(track['styles_full']) > 100 else ''}")
-
-            except Exception:
-                # Тихо пропускаем — стили просто останутся None
-                pass
-
-            # ─── Поиск аудио ───
-            audio_soup = BeautifulSoup(driver.page_source, 'html.parser')
-            audio_url = None
-
-            scripts = audio_soup.find_all('script')
-            for script in scripts:
-                if script.string:
-                    urls = re.findall(r'(https?://[^\s\'"<>]+\.(mp3|wav|ogg|m4a|flac))', script.string, re.I)
-                    if urls:
-                        real_url = urls[0][0]
-                        if 'sil-100.mp3' not in real_url:
-                            audio_url = real_url
-                            break
-
-            if not audio_url:
-                audio_tag = audio_soup.find('audio', src=re.compile(r'\.(mp3|wav|ogg|m4a|flac)$', re.I))
-                if audio_tag and audio_tag.has_attr('src'):
-                    potential = audio_tag['src']
-                    if 'sil-100.mp3' not in potential:
-                        audio_url = potential
-
-            track['audio_url'] = audio_url
-
-            if audio_url:
-                print(f"    🎧 Аудио: {audio_url[:80]}...")
-                track['file_path'] = download_audio(audio_url, track['artist'], track['title'])
+            if track['audio_url']:
+                print(f"    🎧 Аудио: {track['audio_url'][:80]}...")
+                to_download.append(track)
             else:
                 print("    ❌ Аудио не найдено")
 
-        cursor.close()
-        conn.close()
+        # --- ШАГ 4: Параллельное скачивание аудио ---
+        if to_download:
+            print(f"\n=== ЭТАП 4: Скачивание аудио ({len(to_download)}) ===")
+            # Треки с одинаковым "автор - название" пишут в один файл:
+            # скачиваем его один раз, чтобы потоки не писали в него одновременно
+            groups = {}
+            for t in to_download:
+                groups.setdefault(audio_filepath(t['artist'], t['title']), []).append(t)
+
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+                futures = {
+                    executor.submit(download_audio, group[0]['audio_url'], group[0]['artist'], group[0]['title']): group
+                    for group in groups.values()
+                }
+                for future in as_completed(futures):
+                    file_path = future.result()
+                    for t in futures[future]:
+                        t['file_path'] = file_path
 
     except Exception as e:
         print(f"❌ Критическая ошибка: {e}")
@@ -315,29 +546,45 @@ def save_new_tracks(tracks):
     if not tracks:
         return []
 
+    rows = [
+        (
+            track['artist'], track['title'], track['track_url'],
+            track['audio_url'], track['plays'], 1 if track['explicit'] else 0,
+            track['file_path'], track['styles_preview'], track['styles_full']
+        )
+        for track in tracks if track['track_url']
+    ]
+    if not rows:
+        return []
+
     conn = get_db_connection()
     cursor = conn.cursor()
     new_tracks = []
 
-    for track in tracks:
-        if track['track_url'] and not track_exists(cursor, track['track_url']):
-            try:
-                cursor.execute(f"""
-                    INSERT INTO {TABLE_NAME}
-                    (artist, title, track_url, audio_url, plays, explicit, file_path, styles_preview, styles_full)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    track['artist'], track['title'], track['track_url'],
-                    track['audio_url'], track['plays'], 1 if track['explicit'] else 0,
-                    track['file_path'], track['styles_preview'], track['styles_full']
-                ))
-                conn.commit()
+    try:
+        # Одна транзакция на всю пачку: дубликаты отсекает UNIQUE(track_url)
+        conn.execute("BEGIN")
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {TABLE_NAME}")
+        last_id = cursor.fetchone()[0]
+
+        cursor.executemany(f"""
+            INSERT OR IGNORE INTO {TABLE_NAME}
+            (artist, title, track_url, audio_url, plays, explicit, file_path, styles_preview, styles_full)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+        cursor.execute(f"SELECT track_url FROM {TABLE_NAME} WHERE id > ?", (last_id,))
+        inserted_urls = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+
+        for track in tracks:
+            if track['track_url'] in inserted_urls:
+                inserted_urls.discard(track['track_url'])
                 new_tracks.append(track)
                 print(f"  ✅ Добавлено в БД: {track['artist']} - {track['title']}")
-            except sqlite3.IntegrityError:
-                pass
-            except Exception as e:
-                print(f"  ❌ Ошибка сохранения {track['track_url']}: {e}")
+    except Exception as e:
+        conn.rollback()
+        print(f"  ❌ Ошибка сохранения треков: {e}")
 
     cursor.close()
     conn.close()